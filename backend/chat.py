@@ -0,0 +1,358 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+import jwt
+from fastapi import WebSocket, WebSocketDisconnect
+
+from message_filter import filter_message
+from moderation_queue import ModerationJob, ModerationQueue
+from profiling import span
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to clients that cannot keep up with their conversation
+SLOW_CONSUMER_CLOSE = 1013
+# Close code for sockets without a valid token or conversation membership
+POLICY_VIOLATION_CLOSE = 1008
+
+# Browsers cannot set headers on a WebSocket handshake, so they send the JWT
+# as the second of two subprotocols: new WebSocket(url, ["bearer", token]).
+# Unlike a query parameter, it never reaches uvicorn's access log.
+AUTH_SUBPROTOCOL = "bearer"
+
+# Async check that a user may join a conversation
+Authorize = Callable[[str, str], Awaitable[bool]]
+
+
+def user_from_token(token: str, secret: str) -> Optional[str]:
+    """Return the `sub` of a valid HS256 JWT, or None."""
+    if not token or not secret:
+        return None
+    try:
+        claims = jwt.decode(token, secret, algorithms=["HS256"], options={"require": ["sub", "exp"]})
+    except jwt.InvalidTokenError:
+        return None
+    return str(claims["sub"])
+
+
+def token_from_handshake(websocket: WebSocket) -> str:
+    """Read the JWT from an `Authorization: Bearer` header or the auth subprotocol."""
+    auth = websocket.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[7:]
+    protocols = websocket.scope.get("subprotocols", [])
+    if len(protocols) == 2 and protocols[0] == AUTH_SUBPROTOCOL:
+        return protocols[1]
+    return ""
+
+
+def mongo_participants(db) -> Authorize:
+    """Authorize users listed in the conversation's `participants`."""
+    async def authorize(user_id: str, conversation_id: str) -> bool:
+        found = await db.conversations.find_one(
+            {"id": conversation_id, "participants": user_id}, projection={"_id": 1}
+        )
+        return found is not None
+    return authorize
+
+
+async def deny_all(user_id: str, conversation_id: str) -> bool:
+    """Used when no conversation store is configured: nobody may join."""
+    return False
+
+
+class Connection:
+    """One WebSocket participant with a bounded outbound queue."""
+
+    __slots__ = ("websocket", "user_id", "conversation_id", "queue", "writer", "closed")
+
+    def __init__(self, websocket: WebSocket, user_id: str, conversation_id: str, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+    async def write_loop(self) -> None:
+        try:
+            while True:
+                payload = await self.queue.get()
+                await self.websocket.send_text(payload)
+        except Exception:
+            self.closed = True
+
+
+class LocalBroker:
+    """Default broker: conversations are only shared inside this worker."""
+
+    async def start(self, deliver: Callable[[str, str], None]) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, conversation_id: str, payload: str) -> None:
+        pass
+
+
+class UnixSocketBroker:
+    """Share conversations between workers on one host through a relay process.
+
+    Each worker keeps one connection to the relay started with
+    `python chat.py relay <path>` and sends `conversation_id\\tpayload` lines.
+    The relay forwards each line to every other worker. A lost connection
+    is retried with exponential backoff; messages published while it is
+    down are counted in `dropped` and only reach this worker's clients.
+    """
+
+    def __init__(self, path: str, max_backoff: float = 30.0):
+        self.path = path
+        self.max_backoff = max_backoff
+        self.dropped = 0
+        self.reconnects = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self, deliver: Callable[[str, str], None]) -> None:
+        self._task = asyncio.create_task(self._run(deliver), name="chat-broker")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+    async def publish(self, conversation_id: str, payload: str) -> None:
+        if not self.connected:
+            self.dropped += 1
+            return
+        try:
+            self._writer.write(f"{conversation_id}\t{payload}\n".encode())
+            await self._writer.drain()
+        except ConnectionError:
+            self.dropped += 1
+
+    async def _run(self, deliver: Callable[[str, str], None]) -> None:
+        backoff = 0.1
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=2 ** 20)
+                logger.info("chat broker connected to %s", self.path)
+                backoff = 0.1
+                await self._read_loop(reader, deliver)
+                logger.warning("chat broker connection closed by relay")
+            except (ConnectionError, OSError) as exc:
+                logger.warning("chat broker connection to %s failed: %r", self.path, exc)
+            if self._writer:
+                self._writer.close()
+                self._writer = None
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _read_loop(self, reader: asyncio.StreamReader, deliver: Callable[[str, str], None]) -> None:
+        while line := await reader.readline():
+            conversation_id, _, payload = line.decode().rstrip("\n").partition("\t")
+            deliver(conversation_id, payload)
+
+    def stats(self) -> dict:
+        return {"connected": self.connected, "dropped": self.dropped, "reconnects": self.reconnects}
+
+
+class ChatHub:
+    """In-process pub/sub of conversation messages to WebSocket connections.
+
+    Each outbound message is encoded once and the same string is queued
+    for every participant. A participant whose queue is full is evicted
+    rather than allowed to hold up the rest of the conversation.
+    """
+
+    def __init__(
+        self,
+        authorize: Authorize = deny_all,
+        moderation: Optional[ModerationQueue] = None,
+        broker=None,
+        send_queue_size: int = 32,
+        max_message_chars: int = 4000,
+        moderation_timeout: float = 0.5,
+    ):
+        self.authorize = authorize
+        self.moderation = moderation
+        self.moderation_timeout = moderation_timeout
+        self.broker = broker or LocalBroker()
+        self.send_queue_size = send_queue_size
+        self.max_message_chars = max_message_chars
+        self._conversations: dict[str, set[Connection]] = {}
+
+        self.connections = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.rejected = 0
+        self.unmoderated = 0
+
+    async def start(self) -> None:
+        await self.broker.start(self._fan_out)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+        for members in list(self._conversations.values()):
+            for conn in list(members):
+                await self._close(conn, 1001)
+
+    async def serve(self, websocket: WebSocket, conversation_id: str, user_id: Optional[str]) -> None:
+        """Run one participant's socket. `user_id` must come from a verified token."""
+        if user_id is None or not await self.authorize(user_id, conversation_id):
+            self.rejected += 1
+            await websocket.close(POLICY_VIOLATION_CLOSE)
+            return
+        # Echo only the marker, never the token, back to the client
+        offered = websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=AUTH_SUBPROTOCOL if AUTH_SUBPROTOCOL in offered else None)
+        conn = Connection(websocket, user_id, conversation_id, self.send_queue_size)
+        conn.writer = asyncio.create_task(conn.write_loop())
+        self._conversations.setdefault(conversation_id, set()).add(conn)
+        self.connections += 1
+        try:
+            while not conn.closed:
+                text = await websocket.receive_text()
+                await self.send(conn, text)
+        except (WebSocketDisconnect, RuntimeError):
+            # RuntimeError: the socket was already closed by an eviction
+            pass
+        finally:
+            await self._close(conn)
+
+    async def send(self, conn: Connection, raw: str) -> None:
+        text = raw
+        if raw.startswith("{"):
+            try:
+                text = json.loads(raw).get("text", "")
+            except (ValueError, AttributeError):
+                pass
+        if not isinstance(text, str) or not text:
+            return
+        text = text[:self.max_message_chars]
+
+        message_id = uuid.uuid4().hex
+        with span("chat.redact", conversation_id=conn.conversation_id):
+            filtered, redacted = filter_message(text)
+        if self.moderation is not None:
+            # Waiting here pushes back on this sender only; its next message is not read until then
+            job = ModerationJob(message_id, conn.conversation_id, conn.user_id, text)
+            if not await self.moderation.submit(job, timeout=self.moderation_timeout):
+                self.unmoderated += 1
+                logger.warning("moderation queue full; message %s delivered without audit", message_id)
+
+        payload = json.dumps({
+            "type": "message",
+            "id": message_id,
+            "conversation_id": conn.conversation_id,
+            "sender_id": conn.user_id,
+            "text": filtered,
+            "redacted": redacted,
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+        }, separators=(",", ":"))
+        self._fan_out(conn.conversation_id, payload)
+        await self.broker.publish(conn.conversation_id, payload)
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self._conversations),
+            "connections": self.connections,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+            "unmoderated": self.unmoderated,
+            **({"broker": self.broker.stats()} if hasattr(self.broker, "stats") else {}),
+        }
+
+    def _fan_out(self, conversation_id: str, payload: str) -> None:
+        for conn in list(self._conversations.get(conversation_id, ())):
+            if conn.closed:
+                continue
+            try:
+                conn.queue.put_nowait(payload)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.evicted += 1
+                conn.closed = True
+                logger.info("evicting slow chat consumer %s from %s", conn.user_id, conversation_id)
+                asyncio.create_task(self._close(conn, SLOW_CONSUMER_CLOSE))
+
+    async def _close(self, conn: Connection, code: int = 1000) -> None:
+        if conn.writer is None:
+            return
+        members = self._conversations.get(conn.conversation_id)
+        if members is not None:
+            members.discard(conn)
+            if not members:
+                del self._conversations[conn.conversation_id]
+        self.connections -= 1
+        conn.closed = True
+        writer, conn.writer = conn.writer, None
+        writer.cancel()
+        try:
+            await conn.websocket.close(code)
+        except Exception:
+            pass
+
+
+async def run_relay(path: str, max_buffer: int = 2 ** 24) -> None:
+    """Relay lines between worker connections on a Unix socket.
+
+    A worker that stops reading and lets `max_buffer` bytes pile up is
+    disconnected so it cannot grow the relay's memory without bound.
+    """
+    peers: set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peers.add(writer)
+        try:
+            while line := await reader.readline():
+                for peer in list(peers):
+                    if peer is writer or peer.is_closing():
+                        continue
+                    if peer.transport.get_write_buffer_size() > max_buffer:
+                        logger.warning("dropping stalled chat relay peer")
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled handlers are not awaited by anyone; end them quietly
+            pass
+        finally:
+            peers.discard(writer)
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path, limit=2 ** 20)
+    logger.info("chat relay listening on %s", path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # Server.close() leaves accepted connections open; workers must see EOF to reconnect
+        for peer in list(peers):
+            peer.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] != "relay":
+        sys.exit("usage: python chat.py relay <socket-path>")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_relay(sys.argv[2]))
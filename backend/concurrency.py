@@ -0,0 +1,151 @@
+import time
+from typing import Iterable, Optional
+
+
+class AIMDLimiter:
+    """Adaptive in-flight limit driven by smoothed latency.
+
+    Every completed request feeds an exponentially weighted moving average
+    of latency (failures count as twice the target). While the average is
+    under target and the limit is actually in use, the limit grows by about
+    one per limit's worth of requests; once the average overshoots, the
+    limit is cut multiplicatively, at most once per `cooldown` seconds.
+    A lone slow request barely moves the average, and an idle worker keeps
+    its limit instead of drifting down with the request rate. No changes
+    are made until `warmup` samples have been seen.
+    """
+
+    def __init__(
+        self,
+        initial: int = 64,
+        min_limit: int = 4,
+        max_limit: int = 512,
+        target_latency: float = 0.25,
+        backoff: float = 0.8,
+        cooldown: float = 1.0,
+        smoothing: float = 0.05,
+        warmup: int = 20,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.latency: Optional[float] = None
+        self.samples = 0
+        self._last_cut = float("-inf")
+
+        self.inflight = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def try_acquire(self, fraction: float = 1.0) -> bool:
+        """Admit a request if in-flight work is under `fraction` of the limit."""
+        if self.inflight >= self.limit * fraction:
+            self.shed += 1
+            return False
+        self.inflight += 1
+        self.admitted += 1
+        return True
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        busy = self.inflight
+        self.inflight -= 1
+        self.on_sample(latency, failed, busy)
+
+    def on_sample(self, latency: float, failed: bool = False, inflight: Optional[int] = None) -> None:
+        if failed:
+            latency = max(latency, 2 * self.target_latency)
+        self.samples += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        if self.samples < self.warmup:
+            return
+
+        if self.latency > self.target_latency:
+            now = time.monotonic()
+            if now - self._last_cut >= self.cooldown:
+                self._last_cut = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif inflight is None or inflight >= self.limit / 2:
+            # Only grow when the current limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "target_latency_ms": self.target_latency * 1000,
+        }
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware capping in-flight HTTP requests for this worker.
+
+    Requests beyond the current limit are rejected straight away with a
+    503 and Retry-After rather than queued. Cheap routes may use the whole
+    limit; everything else is shed once `reserved` of it is in use, which
+    keeps headroom for cheap routes during a spike. Exempt routes (stats
+    and admin) bypass the limiter so they stay reachable under overload.
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: AIMDLimiter,
+        cheap_prefixes: Iterable[str] = (),
+        exempt_prefixes: Iterable[str] = (),
+        reserved: float = 0.2,
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.cheap_prefixes = tuple(cheap_prefixes)
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.reserved = reserved
+        self.retry_after = str(retry_after).encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        cheap = scope["path"].startswith(self.cheap_prefixes)
+        if not self.limiter.try_acquire(1.0 if cheap else 1 - self.reserved):
+            await self._reject(send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.limiter.release(time.perf_counter() - start, failed=status >= 500)
+
+    async def _reject(self, send) -> None:
+        body = b'{"detail":"Server busy, please retry"}'
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self.retry_after),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
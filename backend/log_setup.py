@@ -0,0 +1,146 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Request context picked up by every record logged while a request is in flight
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+route_var: contextvars.ContextVar[str] = contextvars.ContextVar("route", default="")
+
+_listener = None
+_handler = None
+_sink = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller.
+
+    Records are only tagged with request context on the calling thread;
+    JSON encoding and I/O happen on the listener thread. When the buffer
+    is full the record is dropped and counted.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "route"):
+            record.route = route_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records; warnings and above always pass.
+
+    Records passed with `extra={"sample": False}` are never sampled out.
+    """
+
+    def __init__(self, debug_rate: float = 1.0, info_rate: float = 1.0):
+        super().__init__()
+        self.rates = {logging.DEBUG: debug_rate, logging.INFO: info_rate}
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0 or getattr(record, "sample", True) is False:
+            return True
+        if random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as compact single-line JSON."""
+
+    FIELDS = ("request_id", "route", "method", "status", "span", "duration_ms", "error", "attrs")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in self.FIELDS:
+            value = getattr(record, name, None)
+            if value not in (None, ""):
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+def configure_logging() -> None:
+    """Route all logging through a bounded queue drained by a background listener.
+
+    Settings come from the environment: LOG_LEVEL, LOG_QUEUE_SIZE,
+    LOG_SAMPLE_DEBUG and LOG_SAMPLE_INFO (fraction of records kept).
+    Calling it again after `shutdown_logging` restarts the listener.
+    """
+    global _listener, _handler, _sink
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    if _handler is None:
+        _sink = logging.StreamHandler(sys.stdout)
+        _sink.setFormatter(JsonFormatter())
+
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE", "10000"))))
+        _handler.addFilter(SamplingFilter(
+            debug_rate=float(os.environ.get("LOG_SAMPLE_DEBUG", "0.01")),
+            info_rate=float(os.environ.get("LOG_SAMPLE_INFO", "1.0")),
+        ))
+        root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+        # Let uvicorn's own loggers share the same pipeline
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uv_logger = logging.getLogger(name)
+            uv_logger.handlers[:] = []
+            uv_logger.propagate = True
+
+    root.handlers[:] = [_handler]
+    _listener = logging.handlers.QueueListener(_handler.queue, _sink, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the listener and log directly from then on.
+
+    Records emitted after the app stops (uvicorn's shutdown and exit
+    messages) would otherwise sit in a queue nobody drains.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logging.getLogger().handlers[:] = [_sink]
+
+
+def logging_stats() -> dict:
+    if _handler is None:
+        return {}
+    sampler = next((f for f in _handler.filters if isinstance(f, SamplingFilter)), None)
+    return {
+        "queued": _handler.queue.qsize(),
+        "dropped": _handler.dropped,
+        "sampled_out": sampler.sampled_out if sampler else 0,
+    }
@@ -41,6 +41,29 @@ BLOCKED_PATTERNS = [
 
 REPLACEMENT_TEXT = "[CONTACT INFO BLOCKED - Please use platform messaging]"
 
+# Phrases that suggest an attempt to move the conversation off-platform
+SUSPICIOUS_PHRASES = [
+    "contact me directly",
+    "reach me at",
+    "my number is",
+    "email is",
+    "add me on",
+    "find me on",
+    "connect outside",
+    "talk offline",
+]
+
+# Compiled rules. Workers call load_rules() with the vocabulary mapped from
+# the catalog snapshot; the lists above are the source it is built from.
+_blocked_patterns = [re.compile(p, re.IGNORECASE) for p in BLOCKED_PATTERNS]
+_suspicious_phrases = list(SUSPICIOUS_PHRASES)
+
+def load_rules(blocked_patterns: list[str], suspicious_phrases: list[str]) -> None:
+    """Compile and activate a moderation vocabulary."""
+    global _blocked_patterns, _suspicious_phrases
+    _blocked_patterns = [re.compile(p, re.IGNORECASE) for p in blocked_patterns]
+    _suspicious_phrases = list(suspicious_phrases)
+
 def contains_blocked_content(text: str) -> tuple[bool, list[str]]:
     """Check if text contains blocked patterns.
     
@@ -53,9 +76,9 @@ def contains_blocked_content(text: str) -> tuple[bool, list[str]]:
     text_lower = text.lower()
     matched_patterns = []
     
-    for pattern in BLOCKED_PATTERNS:
-        if re.search(pattern, text_lower, re.IGNORECASE):
-            matched_patterns.append(pattern)
+    for pattern in _blocked_patterns:
+        if pattern.search(text_lower):
+            matched_patterns.append(pattern.pattern)
     
     return len(matched_patterns) > 0, matched_patterns
 
@@ -70,8 +93,8 @@ def filter_message(text: str) -> tuple[str, bool]:
     
     original_text = text
     
-    for pattern in BLOCKED_PATTERNS:
-        text = re.sub(pattern, REPLACEMENT_TEXT, text, flags=re.IGNORECASE)
+    for pattern in _blocked_patterns:
+        text = pattern.sub(REPLACEMENT_TEXT, text)
     
     was_modified = text != original_text
     return text, was_modified
@@ -92,18 +115,7 @@ def is_suspicious_message(text: str) -> tuple[bool, str]:
         return True, "Very short message"
     
     # Repeated attempts to share contact
-    suspicious_phrases = [
-        "contact me directly",
-        "reach me at",
-        "my number is",
-        "email is",
-        "add me on",
-        "find me on",
-        "connect outside",
-        "talk offline",
-    ]
-    
-    for phrase in suspicious_phrases:
+    for phrase in _suspicious_phrases:
         if phrase in text_lower:
             return True, f"Suspicious phrase: {phrase}"
     
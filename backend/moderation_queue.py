@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from message_filter import contains_blocked_content, is_suspicious_message
+from profiling import span
+
+logger = logging.getLogger(__name__)
+
+# A sink receives a batch of audit records and persists them in one write
+Sink = Callable[[list[dict]], Awaitable[None]]
+
+
+@dataclass
+class ModerationJob:
+    message_id: str
+    conversation_id: str
+    sender_id: str
+    text: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+async def log_sink(records: list[dict]) -> None:
+    """Fallback sink used when no database is configured."""
+    flagged = sum(1 for r in records if r["blocked"] or r["suspicious"])
+    logger.info("moderation batch: %d records, %d flagged", len(records), flagged)
+
+
+def mongo_sink(db) -> Sink:
+    """Build a sink writing audit records and flags with one insert_many each."""
+    async def sink(records: list[dict]) -> None:
+        await db.moderation_audit.insert_many([dict(r) for r in records], ordered=False)
+        flags = [dict(r) for r in records if r["blocked"] or r["suspicious"]]
+        if flags:
+            await db.moderation_flags.insert_many(flags, ordered=False)
+    return sink
+
+
+class ModerationQueue:
+    """Bounded in-process queue running heavier moderation checks off the send path.
+
+    Producers call `submit` (waits while the queue is full) or `submit_nowait`
+    (returns False and counts a drop instead). A pool of workers runs the
+    regex checks in the default thread executor, so they stay off the event
+    loop thread, and hands results to the sink in batches.
+    """
+
+    def __init__(
+        self,
+        sink: Sink = log_sink,
+        maxsize: int = 1000,
+        workers: int = 4,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+    ):
+        self.sink = sink
+        self.maxsize = maxsize
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._batch: list[dict] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._accepting = False
+
+        self.processed = 0
+        self.dropped = 0
+        self.failed_writes = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    async def start(self) -> None:
+        if self._accepting:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._flush_lock = asyncio.Lock()
+        self._closing = asyncio.Event()
+        self._accepting = True
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"moderation-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._flusher = asyncio.create_task(self._flush_loop(), name="moderation-flusher")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop accepting jobs, drain what is queued and flush the last batch."""
+        if not self._accepting:
+            return
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("moderation queue drain timed out with %d jobs left", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Let the flusher finish a write it has already taken out of _batch
+        self._closing.set()
+        try:
+            await asyncio.wait_for(self._flusher, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("moderation flusher did not finish within %.1fs", timeout)
+        self._tasks = []
+        self._flusher = None
+
+        abandoned = 0
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            abandoned += 1
+        if abandoned:
+            self.dropped += abandoned
+            logger.warning("moderation queue stopped with %d unprocessed jobs", abandoned)
+        await self._flush()
+
+    async def submit(self, job: ModerationJob, timeout: Optional[float] = None) -> bool:
+        """Enqueue a job, waiting for space. Returns False if not accepted in time."""
+        if not self._accepting:
+            return False
+        try:
+            await asyncio.wait_for(self._queue.put(job), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            return False
+
+    def submit_nowait(self, job: ModerationJob) -> bool:
+        """Enqueue a job without waiting. Returns False if the queue is full."""
+        if not self._accepting:
+            return False
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "running": self._accepting,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "capacity": self.maxsize,
+            "pending_batch": len(self._batch),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed_writes": self.failed_writes,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+        }
+
+    def _moderate(self, job: ModerationJob) -> dict:
+        with span("moderation.check", message_id=job.message_id):
+            blocked, patterns = contains_blocked_content(job.text)
+            suspicious, reason = is_suspicious_message(job.text)
+        return {
+            "message_id": job.message_id,
+            "conversation_id": job.conversation_id,
+            "sender_id": job.sender_id,
+            "blocked": blocked,
+            "matched_patterns": patterns,
+            "suspicious": suspicious,
+            "reason": reason,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            checked = False
+            try:
+                lag = time.monotonic() - job.enqueued_at
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                record = await asyncio.to_thread(self._moderate, job)
+                checked = True
+                self._batch.append(record)
+                self.processed += 1
+                if len(self._batch) >= self.batch_size:
+                    await self._flush()
+            except asyncio.CancelledError:
+                # Cancelled by stop() after a drain timeout; a checked job is
+                # already counted by _flush if its write was cut short
+                if not checked:
+                    self.dropped += 1
+                raise
+            except Exception:
+                logger.exception("moderation worker %d failed on message %s", index, job.message_id)
+            finally:
+                self._queue.task_done()
+
+    async def _flush_loop(self) -> None:
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self._flush()
+
+    async def _flush(self) -> None:
+        async with self._flush_lock:
+            if not self._batch:
+                return
+            batch, self._batch = self._batch, []
+            try:
+                await self.sink(batch)
+            except asyncio.CancelledError:
+                self.failed_writes += len(batch)
+                logger.warning("moderation sink write of %d records cancelled", len(batch))
+                raise
+            except Exception:
+                self.failed_writes += len(batch)
+                logger.exception("moderation sink failed to write %d records", len(batch))
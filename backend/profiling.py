@@ -0,0 +1,246 @@
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+def collapse_stack(frame, limit: int = 128) -> str:
+    """Render a frame as a collapsed stack line (root first, `;` separated)."""
+    parts = []
+    while frame is not None and len(parts) < limit:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+# Profiler threads are left out of their own samples
+_PROFILER_THREADS = ("sampling-profiler", "slow-request-watchdog")
+
+
+class SamplingProfiler:
+    """Wall-clock sampler for every thread in the process.
+
+    A daemon thread reads each thread's current frame at a fixed interval
+    and aggregates collapsed stacks, ready for flamegraph.pl or speedscope.
+    Each stack is rooted at its thread name, and the attached event loop
+    thread is labelled `event-loop`, so work moved to executor threads
+    (such as the moderation checks) shows up beside the loop. Nothing runs
+    unless a capture is in progress.
+    """
+
+    def __init__(self, output_dir: Path, interval: float = 0.005):
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.target_thread: Optional[int] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def attach(self, thread_id: Optional[int] = None) -> None:
+        self.target_thread = thread_id or threading.get_ident()
+
+    def start(self, seconds: float, label: str = "manual") -> bool:
+        """Capture for `seconds` in the background. Returns False if one is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, label), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def sample(self) -> list[str]:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            name = "event-loop" if ident == self.target_thread else names.get(ident, f"thread-{ident}")
+            if name in _PROFILER_THREADS or ident == threading.get_ident():
+                continue
+            stacks.append(f"{name};{collapse_stack(frame)}")
+        return stacks
+
+    def write(self, samples: Counter, label: str) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"{label}-{int(time.time())}.collapsed"
+        with path.open("w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def prune(self, prefix: str, keep: int) -> None:
+        """Delete the oldest `prefix*` profiles beyond the newest `keep`."""
+        paths = sorted(self.output_dir.glob(f"{prefix}*.collapsed"), key=lambda p: p.stat().st_mtime)
+        for path in paths[:max(0, len(paths) - keep)]:
+            path.unlink(missing_ok=True)
+
+    def _run(self, seconds: float, label: str) -> None:
+        samples: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            samples.update(self.sample())
+            self._stop.wait(self.interval)
+        path = self.write(samples, label)
+        logger.warning("profile written to %s (%d samples)", path, sum(samples.values()))
+
+
+class SlowRequestWatchdog:
+    """Profile the process while any in-flight request is past the threshold.
+
+    The watchdog thread only wakes when requests are in flight, and only
+    samples once one of them is slow. Samples are attributed to the slow
+    request and written when it completes. On a single event loop the
+    stacks show whatever was running while that request was slow, which
+    is usually what made it slow.
+
+    Files are named with a server-side sequence number, written on a
+    background thread, limited to one per `min_interval` seconds and
+    pruned to the newest `max_files`.
+    """
+
+    def __init__(
+        self,
+        profiler: SamplingProfiler,
+        threshold_ms: float,
+        min_interval: float = 10.0,
+        max_files: int = 50,
+    ):
+        self.profiler = profiler
+        self.threshold = threshold_ms / 1000
+        self.min_interval = min_interval
+        self.max_files = max_files
+        self.skipped = 0
+        self._ids = itertools.count()
+        self._last_write = float("-inf")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-request-writer")
+        self._inflight: dict[int, float] = {}
+        self._samples: dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="slow-request-watchdog", daemon=True)
+        self._thread.start()
+
+    def begin(self) -> int:
+        """Start tracking a request. Returns the capture id to pass to `end`."""
+        capture_id = next(self._ids)
+        with self._lock:
+            self._inflight[capture_id] = time.monotonic()
+        self._wake.set()
+        return capture_id
+
+    def end(self, capture_id: int, request_id: str = "", route: str = "") -> None:
+        with self._lock:
+            self._inflight.pop(capture_id, None)
+            samples = self._samples.pop(capture_id, None)
+        if not samples:
+            return
+        now = time.monotonic()
+        if now - self._last_write < self.min_interval:
+            self.skipped += 1
+            return
+        self._last_write = now
+        self._writer.submit(self._write, samples, capture_id, request_id, route)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self._writer.shutdown(wait=True)
+
+    def _write(self, samples: Counter, capture_id: int, request_id: str, route: str) -> None:
+        try:
+            path = self.profiler.write(samples, f"slow-{capture_id}")
+            self.profiler.prune("slow-", self.max_files)
+        except OSError:
+            logger.exception("could not write slow request profile")
+            return
+        logger.warning("slow request %s %s profiled to %s", request_id, route, path)
+
+    def _run(self) -> None:
+        while not self._closed:
+            with self._lock:
+                idle = not self._inflight
+            if idle:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            now = time.monotonic()
+            with self._lock:
+                slow = [rid for rid, start in self._inflight.items() if now - start >= self.threshold]
+            if not slow:
+                time.sleep(min(self.threshold / 4, 0.05))
+                continue
+            stacks = self.profiler.sample()
+            with self._lock:
+                for rid in slow:
+                    if rid in self._inflight:
+                        self._samples.setdefault(rid, Counter()).update(stacks)
+            time.sleep(self.profiler.interval)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        logger.info(
+            "span %s",
+            self.name,
+            extra={
+                "span": self.name,
+                "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+                "error": exc_type.__name__ if exc_type else None,
+                "attrs": self.attrs or None,
+            },
+        )
+        return False
+
+
+def span(span_name: str, /, **attrs):
+    """Time a block and log it as a tracing span. A shared no-op when tracing is off.
+
+    Keyword arguments are logged under `attrs`, so any name is allowed.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return _Span(span_name, attrs)
@@ -0,0 +1,250 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    media_type: str
+    status_code: int
+    fresh_until: float
+    stale_until: float
+    tags: tuple[str, ...]
+
+
+def public_scope(request: Request) -> str:
+    """Scope for responses that are identical for every caller."""
+    return "public"
+
+
+def auth_scope(request: Request) -> str:
+    """Scope responses per credential, without keeping the raw token in memory."""
+    token = request.headers.get("authorization", "")
+    if not token:
+        return "anon"
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def make_key(request: Request, scope: str, params: Optional[frozenset[str]] = None) -> str:
+    """Key a request by path, query and scope.
+
+    With `params`, only those query parameters count, so arbitrary extra
+    parameters cannot bypass the cache or evict real entries.
+    """
+    items = request.query_params.multi_items()
+    if params is not None:
+        items = [(k, v) for k, v in items if k in params]
+    return f"{request.url.path}?{urlencode(sorted(items))}|{scope}"
+
+
+def _query_names(sig: inspect.Signature) -> frozenset[str]:
+    # Path parameters are already part of the path; aliases are what clients send
+    return frozenset(getattr(p.default, "alias", None) or p.name for p in sig.parameters.values())
+
+
+class ResponseCache:
+    """In-process TTL cache for route responses.
+
+    Fresh entries are served directly. Entries past their TTL but inside
+    the stale window are served while one background task refreshes them.
+    Concurrent misses for the same key share a single loader call. The
+    least recently used entries are evicted past `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._inflight_tags: dict[str, tuple[str, ...]] = {}
+        self._tags: dict[str, set[str]] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def cached(
+        self,
+        ttl: float,
+        stale_ttl: float = 0,
+        tags: Iterable[str] = (),
+        scope: Callable[[Request], str] = public_scope,
+    ):
+        """Decorate a route handler so its JSON response is cached.
+
+        The cached bytes are returned as-is, so response_model validation
+        only runs when the handler actually executes. Only the query
+        parameters the handler declares are part of the key.
+        """
+        tags = tuple(tags)
+
+        def decorator(func):
+            sig = inspect.signature(func)
+            inject_request = "request" not in sig.parameters
+            query_names = _query_names(sig)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.pop("request") if inject_request else kwargs["request"]
+                key = make_key(request, scope(request), query_names)
+                return await self.get_or_load(key, lambda: func(*args, **kwargs), ttl, stale_ttl, tags)
+
+            if inject_request:
+                params = list(sig.parameters.values())
+                params.append(inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+                wrapper.__signature__ = sig.replace(parameters=params)
+            return wrapper
+
+        return decorator
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable],
+        ttl: float,
+        stale_ttl: float = 0,
+        tags: tuple[str, ...] = (),
+    ) -> Response:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._respond(entry)
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._start_load(key, loader, ttl, stale_ttl, tags)
+                return self._respond(entry)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            future = self._start_load(key, loader, ttl, stale_ttl, tags)
+        return self._respond(await asyncio.shield(future))
+
+    def invalidate(self, key: str) -> None:
+        """Drop `key` and detach any load already in flight for it.
+
+        Requests arriving afterwards start a fresh load instead of joining
+        one that may have read data from before the write.
+        """
+        self._detach(key)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._untag(key, entry.tags)
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Drop every entry carrying `tag`. Write paths call this after committing."""
+        for key in [k for k, tags in self._inflight_tags.items() if tag in tags]:
+            self._detach(key)
+        keys = self._tags.pop(tag, set())
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def invalidate_prefix(self, path_prefix: str) -> int:
+        for key in [k for k in self._inflight if k.startswith(path_prefix)]:
+            self._detach(key)
+        keys = [key for key in self._entries if key.startswith(path_prefix)]
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._inflight.clear()
+        self._inflight_tags.clear()
+        self._entries.clear()
+        self._tags.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
+
+    def _start_load(self, key, loader, ttl, stale_ttl, tags) -> asyncio.Future:
+        task = asyncio.ensure_future(self._load(key, loader, ttl, stale_ttl, tags))
+        self._inflight[key] = task
+        self._inflight_tags[key] = tags
+        task.add_done_callback(functools.partial(self._load_done, key))
+        return task
+
+    def _detach(self, key: str) -> None:
+        # Callers already awaiting the old load still get its result, but
+        # _load no longer finds itself in _inflight and skips storing it
+        self._inflight.pop(key, None)
+        self._inflight_tags.pop(key, None)
+
+    def _load_done(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            self._detach(key)
+        # HTTPException is a normal response (e.g. 404), not a failed load
+        if not task.cancelled() and task.exception() is not None and not isinstance(task.exception(), HTTPException):
+            logger.warning("cache load for %s failed: %r", key, task.exception())
+
+    async def _load(self, key, loader, ttl, stale_ttl, tags) -> CacheEntry:
+        result = await loader()
+        if isinstance(result, Response):
+            body, media_type, status_code = result.body, result.media_type, result.status_code
+        else:
+            body = json.dumps(jsonable_encoder(result), separators=(",", ":")).encode()
+            media_type, status_code = "application/json", 200
+
+        now = time.monotonic()
+        entry = CacheEntry(body, media_type, status_code, now + ttl, now + ttl + stale_ttl, tags)
+        # Only successful responses are worth sharing, and only from a load
+        # that was not detached by an invalidation of this key meanwhile
+        if status_code < 400 and self._inflight.get(key) is asyncio.current_task():
+            self._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._untag(key, old.tags)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._untag(evicted_key, evicted.tags)
+            self.evictions += 1
+
+    def _untag(self, key: str, tags: tuple[str, ...]) -> None:
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    @staticmethod
+    def _respond(entry: CacheEntry) -> Response:
+        return Response(content=entry.body, status_code=entry.status_code, media_type=entry.media_type)
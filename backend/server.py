@@ -1,208 +1,232 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Header, HTTPException, WebSocket, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import os
+import hmac
+import signal
+import asyncio
+import time
+import uuid
 import logging
 from pathlib import Path
 
+from log_setup import configure_logging, shutdown_logging, logging_stats, request_id_var, route_var
+from moderation_queue import ModerationQueue, log_sink, mongo_sink
+from profiling import SamplingProfiler, SlowRequestWatchdog, span
+from response_cache import ResponseCache
+from concurrency import AIMDLimiter, ConcurrencyLimitMiddleware
+from chat import ChatHub, UnixSocketBroker, deny_all, mongo_participants, token_from_handshake, user_from_token
+from snapshot import open_catalog_snapshot
+from message_filter import load_rules
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-app = FastAPI()
+configure_logging()
+logger = logging.getLogger(__name__)
+
+mongo_client = None
+if os.environ.get('MONGO_URL'):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    mongo_client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = mongo_client[os.environ.get('DB_NAME', 'talentbridge')]
+
+# Catalog, pricing and moderation data are packed at deploy time (python snapshot.py) and mapped by every worker
+catalog_snapshot = open_catalog_snapshot(Path(os.environ.get('CATALOG_SNAPSHOT', ROOT_DIR / 'catalog.snap')))
+load_rules(
+    catalog_snapshot.strings("moderation:blocked_patterns"),
+    catalog_snapshot.strings("moderation:suspicious_phrases"),
+)
+# ASGI response bodies must be bytes, so the two pre-encoded bodies (a few KB)
+# are copied out of the mapping once per worker rather than once per request
+CATEGORIES_BODY = bytes(catalog_snapshot.raw("response:/api/categories"))
+PRICING_PLANS_BODY = bytes(catalog_snapshot.raw("response:/api/pricing/plans"))
+
+moderation_queue = ModerationQueue(
+    sink=mongo_sink(db) if mongo_client else log_sink,
+    maxsize=int(os.environ.get('MODERATION_QUEUE_SIZE', '1000')),
+    workers=int(os.environ.get('MODERATION_WORKERS', '4')),
+    batch_size=int(os.environ.get('MODERATION_BATCH_SIZE', '100')),
+    flush_interval=float(os.environ.get('MODERATION_FLUSH_INTERVAL', '1.0')),
+)
+
+chat_hub = ChatHub(
+    authorize=mongo_participants(db) if mongo_client else deny_all,
+    moderation=moderation_queue,
+    broker=UnixSocketBroker(os.environ['CHAT_BROKER_SOCKET']) if os.environ.get('CHAT_BROKER_SOCKET') else None,
+    send_queue_size=int(os.environ.get('CHAT_SEND_QUEUE', '32')),
+)
+
+response_cache = ResponseCache(max_entries=int(os.environ.get('RESPONSE_CACHE_ENTRIES', '1024')))
+
+concurrency_limiter = AIMDLimiter(
+    initial=int(os.environ.get('CONCURRENCY_INITIAL', '64')),
+    min_limit=int(os.environ.get('CONCURRENCY_MIN', '4')),
+    max_limit=int(os.environ.get('CONCURRENCY_MAX', '512')),
+    target_latency=float(os.environ.get('CONCURRENCY_TARGET_MS', '250')) / 1000,
+)
+
+profiler = SamplingProfiler(
+    output_dir=Path(os.environ.get('PROFILE_DIR', '/tmp/talentbridge-profiles')),
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000,
+)
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN', '')
+slow_request_watchdog = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global slow_request_watchdog
+    configure_logging()
+    profiler.attach()
+    if os.environ.get('SLOW_REQUEST_MS'):
+        slow_request_watchdog = SlowRequestWatchdog(
+            profiler,
+            float(os.environ['SLOW_REQUEST_MS']),
+            min_interval=float(os.environ.get('SLOW_REQUEST_PROFILE_INTERVAL', '10')),
+            max_files=int(os.environ.get('SLOW_REQUEST_PROFILE_FILES', '50')),
+        )
+    try:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGUSR1,
+            lambda: profiler.start(float(os.environ.get('PROFILE_SIGNAL_SECONDS', '30')), label="signal"),
+        )
+    except (NotImplementedError, AttributeError, RuntimeError):
+        logger.info("SIGUSR1 profiling trigger not available on this platform")
+    await moderation_queue.start()
+    await chat_hub.start()
+    yield
+    await chat_hub.stop()
+    await moderation_queue.stop()
+    profiler.stop()
+    if slow_request_watchdog:
+        slow_request_watchdog.close()
+    if mongo_client:
+        mongo_client.close()
+    shutdown_logging()
+
+class RequestContextMiddleware:
+    """Tag log records with the request id and route, and log each completed request.
+
+    Pure ASGI like ConcurrencyLimitMiddleware, so the hot path does not pay
+    for BaseHTTPMiddleware's task group and body streams.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = ""
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        request_id = request_id or uuid.uuid4().hex
+        path = scope["path"]
+        request_id_token = request_id_var.set(request_id)
+        route_token = route_var.set(path)
+        start = time.perf_counter()
+        status = 500
+        capture_id = slow_request_watchdog.begin() if slow_request_watchdog else None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            with span("route", method=scope["method"]):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            if capture_id is not None:
+                slow_request_watchdog.end(capture_id, request_id, path)
+            logger.info(
+                "request completed",
+                extra={
+                    "method": scope["method"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                },
+            )
+            request_id_var.reset(request_id_token)
+            route_var.reset(route_token)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestContextMiddleware)
 api_router = APIRouter(prefix="/api")
 
 # ===== CATEGORIES =====
 @api_router.get("/categories")
 async def get_categories():
-    return {
-        "development_it": {
-            "name": "Development & IT",
-            "description": "Software development and technology services",
-            "subcategories": [
-                "Web Development",
-                "Mobile App Development (iOS, Android)",
-                "Desktop Software Development",
-                "Ecommerce Development (Shopify, WooCommerce)",
-                "CMS Development (WordPress, Webflow)",
-                "Game Development",
-                "Scripts & Automation",
-                "API Development & Integration",
-                "Cloud Engineering (AWS, Azure, Google Cloud)",
-                "DevOps & Infrastructure",
-                "Cybersecurity",
-                "Blockchain & Web3",
-                "QA & Testing"
-            ]
-        },
-        "ai_services": {
-            "name": "AI Services",
-            "description": "Artificial intelligence and machine learning",
-            "subcategories": [
-                "AI Model Development",
-                "Machine Learning",
-                "Chatbot Development",
-                "AI Integration",
-                "Generative AI",
-                "Prompt Engineering",
-                "AI Automation"
-            ]
-        },
-        "data_science": {
-            "name": "Data Science & Analytics",
-            "description": "Data analysis and business intelligence",
-            "subcategories": [
-                "Data Analysis",
-                "Data Visualization",
-                "Data Engineering",
-                "Data Mining",
-                "Business Intelligence",
-                "SQL & Database Management",
-                "Power BI",
-                "Tableau"
-            ]
-        },
-        "design_creative": {
-            "name": "Design & Creative",
-            "description": "Visual design and creative services",
-            "subcategories": [
-                "Graphic Design",
-                "Logo Design",
-                "UI/UX Design",
-                "Web Design",
-                "Product Design",
-                "Video Editing",
-                "Animation & Motion Graphics",
-                "3D Modeling & Rendering",
-                "Illustration",
-                "Branding & Identity"
-            ]
-        },
-        "writing_translation": {
-            "name": "Writing & Translation",
-            "description": "Content creation and language services",
-            "subcategories": [
-                "Content Writing",
-                "Copywriting",
-                "Blog Writing",
-                "Technical Writing",
-                "SEO Writing",
-                "Translation",
-                "Proofreading & Editing",
-                "Resume & CV Writing"
-            ]
-        },
-        "sales_marketing": {
-            "name": "Sales & Marketing",
-            "description": "Digital marketing and business growth",
-            "subcategories": [
-                "Digital Marketing",
-                "Social Media Marketing",
-                "Social Media Management",
-                "Search Engine Optimization (SEO)",
-                "Search Engine Marketing (Google Ads)",
-                "Email Marketing",
-                "Lead Generation",
-                "Marketing Strategy",
-                "Sales & Business Development"
-            ]
-        },
-        "admin_support": {
-            "name": "Admin & Customer Support",
-            "description": "Virtual assistance and administrative services",
-            "subcategories": [
-                "Virtual Assistance",
-                "Data Entry",
-                "Customer Support",
-                "Email Support",
-                "Chat Support",
-                "Phone Support",
-                "Appointment Setting",
-                "Project Management"
-            ]
-        },
-        "finance_accounting": {
-            "name": "Finance & Accounting",
-            "description": "Financial management and bookkeeping",
-            "subcategories": [
-                "Bookkeeping",
-                "Accounting",
-                "Payroll",
-                "Financial Analysis",
-                "Tax Preparation",
-                "Financial Modeling"
-            ]
-        },
-        "hr_training": {
-            "name": "HR & Training",
-            "description": "Human resources and talent management",
-            "subcategories": [
-                "Recruiting & Talent Sourcing",
-                "HR Management",
-                "Training & Development",
-                "Interviewing",
-                "HR Consulting"
-            ]
-        },
-        "legal": {
-            "name": "Legal",
-            "description": "Legal consulting and services",
-            "subcategories": [
-                "Contract Drafting",
-                "Legal Consulting",
-                "Compliance",
-                "Corporate Law",
-                "Intellectual Property"
-            ]
-        },
-        "engineering_architecture": {
-            "name": "Engineering & Architecture",
-            "description": "Engineering design and architecture services",
-            "subcategories": [
-                "Civil Engineering",
-                "Mechanical Engineering",
-                "Electrical Engineering",
-                "Structural Engineering",
-                "Architecture",
-                "CAD Design",
-                "Interior Design"
-            ]
-        }
-    }
+    return Response(content=CATEGORIES_BODY, media_type="application/json")
 
 # ===== PRICING =====
 @api_router.get("/pricing/plans")
 async def get_pricing_plans():
-    return {
-        "plans": [
-            {
-                "name": "Free",
-                "price": 0,
-                "features": ["Post up to 3 jobs per month", "Basic support", "Standard job visibility"],
-                "job_limit": 3
-            },
-            {
-                "name": "Professional",
-                "price": 299,
-                "currency": "ZAR",
-                "features": ["Unlimited job posts", "Featured job listings", "Priority support", "Access to talent database"],
-                "job_limit": -1
-            },
-            {
-                "name": "Enterprise",
-                "price": 999,
-                "currency": "ZAR",
-                "features": ["Everything in Professional", "Dedicated account manager", "Custom integrations", "Advanced analytics"],
-                "job_limit": -1
-            }
-        ],
-        "commission": {
-            "transaction_fee": "8-20%",
-            "placement_fee": "10-20% of first year salary"
-        }
-    }
+    return Response(content=PRICING_PLANS_BODY, media_type="application/json")
+
+# ===== MESSAGING =====
+@api_router.websocket("/ws/chat/{conversation_id}")
+async def chat_socket(websocket: WebSocket, conversation_id: str):
+    # No query-string token: uvicorn logs the full path of every WebSocket handshake
+    user_id = user_from_token(token_from_handshake(websocket), os.environ.get('JWT_SECRET', ''))
+    await chat_hub.serve(websocket, conversation_id, user_id)
+
+@api_router.get("/chat/stats")
+async def get_chat_stats():
+    return chat_hub.stats()
+
+# ===== MODERATION =====
+@api_router.get("/moderation/stats")
+async def get_moderation_stats():
+    return moderation_queue.stats()
+
+@api_router.get("/concurrency/stats")
+async def get_concurrency_stats():
+    return concurrency_limiter.stats()
+
+@api_router.get("/snapshot/stats")
+async def get_snapshot_stats():
+    return catalog_snapshot.stats()
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+@api_router.get("/logging/stats")
+async def get_logging_stats():
+    return logging_stats()
+
+# ===== ADMIN =====
+@api_router.post("/admin/profile")
+async def start_profile(seconds: float = 10, x_admin_token: str = Header(default="")):
+    if not PROFILER_TOKEN or not hmac.compare_digest(x_admin_token, PROFILER_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+    seconds = max(0.1, min(seconds, 300))
+    if not profiler.start(seconds, label="admin"):
+        raise HTTPException(status_code=409, detail="A profile is already being captured")
+    return {"profiling": True, "seconds": seconds, "output_dir": str(profiler.output_dir)}
 
 app.include_router(api_router)
 
+app.add_middleware(
+    ConcurrencyLimitMiddleware,
+    limiter=concurrency_limiter,
+    cheap_prefixes=os.environ.get('CONCURRENCY_CHEAP_ROUTES', '/api/categories,/api/pricing').split(','),
+    exempt_prefixes=os.environ.get(
+        'CONCURRENCY_EXEMPT_ROUTES',
+        '/api/admin,/api/moderation/stats,/api/logging/stats,/api/cache/stats,'
+        '/api/concurrency/stats,/api/chat/stats,/api/snapshot/stats',
+    ).split(','),
+    reserved=float(os.environ.get('CONCURRENCY_RESERVED', '0.2')),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -210,9 +234,3 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Layout (little endian):
+#   header   magic(8) version(u32) section_count(u32) source_digest(32)
+#   sections section_count * (name_len u16, name utf-8, kind u8, offset u64, length u64)
+#   payload  section bodies referenced by absolute offset
+#
+# The `strings` section is an interned string table: count(u32), then
+# count + 1 u32 offsets into the utf-8 blob that follows. STRING_LIST
+# sections are arrays of u32 indices into that table; RAW sections are
+# opaque bytes such as pre-serialized JSON responses. Index arrays are read
+# with memoryview.cast, which assumes a little-endian host.
+MAGIC = b"TBSNAP\x00\x01"
+VERSION = 1
+HEADER = struct.Struct("<8sII32s")
+SECTION_TAIL = struct.Struct("<BQQ")
+
+RAW = 0
+STRING_LIST = 1
+
+# Modules the catalog snapshot is built from; the header digest is over their bytes
+SOURCES = ("catalog.py", "message_filter.py")
+
+
+def _encode_json(value) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def source_digest() -> bytes:
+    """Hash the source files without importing them."""
+    digest = hashlib.sha256()
+    for name in SOURCES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    return digest.digest()
+
+
+class SnapshotBuilder:
+    def __init__(self):
+        self._strings: list[str] = []
+        self._index: dict[str, int] = {}
+        self._sections: list[tuple[str, int, bytes]] = []
+
+    def intern(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self._strings)
+            self._strings.append(value)
+        return index
+
+    def add_raw(self, name: str, data: bytes) -> None:
+        self._sections.append((name, RAW, data))
+
+    def add_strings(self, name: str, values: list[str]) -> None:
+        indices = [self.intern(v) for v in values]
+        self._sections.append((name, STRING_LIST, struct.pack(f"<{len(indices)}I", *indices)))
+
+    def _string_table(self) -> bytes:
+        encoded = [s.encode() for s in self._strings]
+        offsets = [0]
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return struct.pack(f"<I{len(offsets)}I", len(encoded), *offsets) + b"".join(encoded)
+
+    def build(self, digest: bytes) -> bytes:
+        sections = [("strings", RAW, self._string_table()), *self._sections]
+        table_size = sum(2 + len(name.encode()) + SECTION_TAIL.size for name, _, _ in sections)
+        offset = HEADER.size + table_size
+        table, bodies = [], []
+        for name, kind, body in sections:
+            encoded_name = name.encode()
+            table.append(struct.pack("<H", len(encoded_name)) + encoded_name + SECTION_TAIL.pack(kind, offset, len(body)))
+            bodies.append(body)
+            offset += len(body)
+        return HEADER.pack(MAGIC, VERSION, len(sections), digest) + b"".join(table) + b"".join(bodies)
+
+
+class Snapshot:
+    """Read-only view over a memory-mapped snapshot file.
+
+    Every worker maps the same file, so the pages are shared through the
+    OS page cache rather than copied into each process.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, count, self.digest = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} snapshot")
+
+        self._sections: dict[str, tuple[int, int, int]] = {}
+        pos = HEADER.size
+        for _ in range(count):
+            (name_len,) = struct.unpack_from("<H", self._mmap, pos)
+            name = bytes(self._view[pos + 2:pos + 2 + name_len]).decode()
+            pos += 2 + name_len
+            self._sections[name] = SECTION_TAIL.unpack_from(self._mmap, pos)
+            pos += SECTION_TAIL.size
+
+        _, table_offset, _ = self._sections["strings"]
+        (self._string_count,) = struct.unpack_from("<I", self._mmap, table_offset)
+        self._offsets = self._view[table_offset + 4:table_offset + 8 + 4 * self._string_count].cast("I")
+        self._blob = table_offset + 8 + 4 * self._string_count
+
+    def raw(self, name: str) -> memoryview:
+        kind, offset, length = self._sections[name]
+        return self._view[offset:offset + length]
+
+    def string(self, index: int) -> str:
+        start = self._blob + self._offsets[index]
+        end = self._blob + self._offsets[index + 1]
+        return str(self._view[start:end], "utf-8")
+
+    def strings(self, name: str) -> list[str]:
+        kind, offset, length = self._sections[name]
+        if kind != STRING_LIST:
+            raise TypeError(f"section {name!r} is not a string list")
+        return [self.string(i) for i in self._view[offset:offset + length].cast("I")]
+
+    def sections(self) -> list[str]:
+        return list(self._sections)
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "bytes": len(self._mmap),
+            "sections": len(self._sections),
+            "strings": self._string_count,
+            "digest": self.digest.hex()[:16],
+        }
+
+
+def build_catalog_snapshot(path: Path) -> Snapshot:
+    """Pack the catalog, pricing and moderation data into a snapshot file at `path`.
+
+    Run at deploy time (`python snapshot.py <path>`) before workers start.
+    The file is written to a temporary name and renamed into place, so a
+    worker never maps a partial file.
+    """
+    from catalog import CATEGORIES, PRICING_PLANS
+    from message_filter import BLOCKED_PATTERNS, SUSPICIOUS_PHRASES
+
+    builder = SnapshotBuilder()
+    builder.add_raw("response:/api/categories", _encode_json(CATEGORIES))
+    builder.add_raw("response:/api/pricing/plans", _encode_json(PRICING_PLANS))
+    builder.add_strings("categories", list(CATEGORIES))
+    for key, category in CATEGORIES.items():
+        builder.add_strings(f"category:{key}", [category["name"], category["description"], *category["subcategories"]])
+    builder.add_strings("moderation:blocked_patterns", BLOCKED_PATTERNS)
+    builder.add_strings("moderation:suspicious_phrases", SUSPICIOUS_PHRASES)
+    data = builder.build(source_digest())
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    logger.info("built catalog snapshot %s (%d bytes)", path, len(data))
+    return Snapshot(path)
+
+
+def open_catalog_snapshot(path: Path) -> Snapshot:
+    """Map a prebuilt snapshot. Workers never import or re-encode the sources.
+
+    The header digest is checked against the bytes of the source files. A
+    missing or stale file is rebuilt on the spot with a warning, so local
+    development (including --reload) and a deploy that skipped the build
+    step never serve outdated data.
+    """
+    path = Path(path)
+    if not path.exists():
+        logger.warning("catalog snapshot %s missing; building it in this process", path)
+        return build_catalog_snapshot(path)
+    snapshot = Snapshot(path)
+    if snapshot.digest != source_digest():
+        logger.warning("catalog snapshot %s is older than %s; rebuilding it in this process", path, ", ".join(SOURCES))
+        return build_catalog_snapshot(path)
+    return snapshot
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = Path(sys.argv[1] if len(sys.argv) > 1 else os.environ.get("CATALOG_SNAPSHOT", "catalog.snap"))
+    print(json.dumps(build_catalog_snapshot(target).stats()))
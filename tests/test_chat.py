@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from chat import (
+    SLOW_CONSUMER_CLOSE,
+    ChatHub,
+    Connection,
+    UnixSocketBroker,
+    run_relay,
+    token_from_handshake,
+    user_from_token,
+)
+from message_filter import REPLACEMENT_TEXT
+from moderation_queue import ModerationQueue
+
+SECRET = "test-secret-with-at-least-32-bytes!"
+
+
+def make_token(sub: str, secret: str = SECRET, expires_in: int = 60) -> str:
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + expires_in}, secret, algorithm="HS256")
+
+
+def auth(token: str) -> dict:
+    return {"subprotocols": ["bearer", token]}
+
+
+def make_app(hub: ChatHub) -> FastAPI:
+    app = FastAPI()
+
+    @app.websocket("/ws/{conversation_id}")
+    async def socket(websocket: WebSocket, conversation_id: str):
+        await hub.serve(websocket, conversation_id, user_from_token(token_from_handshake(websocket), SECRET))
+
+    return app
+
+
+async def members_of(conversation_id: str, user_id: str) -> bool:
+    return conversation_id == "c1" and user_id in {"alice", "bob"}
+
+
+def test_user_from_token():
+    assert user_from_token(make_token("alice"), SECRET) == "alice"
+    assert user_from_token(make_token("alice", secret="another-secret-of-at-least-32-bytes"), SECRET) is None
+    assert user_from_token(make_token("alice", expires_in=-10), SECRET) is None
+    assert user_from_token("", SECRET) is None
+    assert user_from_token(make_token("alice"), "") is None
+
+
+@pytest.mark.parametrize("path,kwargs", [
+    ("/ws/c1", {}),
+    ("/ws/c1", auth("garbage")),
+    (f"/ws/c1?token={make_token('alice')}", {}),
+    ("/ws/c2", auth(make_token("alice"))),
+])
+def test_unauthorized_sockets_are_rejected(path, kwargs):
+    hub = ChatHub(authorize=lambda user, conv: members_of(conv, user))
+    with TestClient(make_app(hub)) as client:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect(path, **kwargs):
+                pass
+    assert exc.value.code == 1008
+    assert hub.rejected == 1
+
+
+def test_messages_are_redacted_and_fanned_out():
+    hub = ChatHub(authorize=lambda user, conv: members_of(conv, user))
+    with TestClient(make_app(hub)) as client:
+        with client.websocket_connect("/ws/c1", **auth(make_token("alice"))) as alice, \
+                client.websocket_connect("/ws/c1", headers={"authorization": f"Bearer {make_token('bob')}"}) as bob:
+            assert alice.accepted_subprotocol == "bearer"
+            assert bob.accepted_subprotocol is None
+            alice.send_text('{"text": "mail me at joe@example.com"}')
+            received = [bob.receive_json(), alice.receive_json()]
+    assert received[0] == received[1]
+    assert received[0]["sender_id"] == "alice"
+    assert received[0]["redacted"] is True
+    assert "joe@example.com" not in received[0]["text"]
+    assert REPLACEMENT_TEXT in received[0]["text"]
+    assert hub.delivered == 2
+
+
+class StuckSocket:
+    def __init__(self):
+        self.close_code = None
+
+    async def send_text(self, payload):
+        await asyncio.sleep(60)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def test_slow_consumer_is_evicted():
+    async def scenario():
+        hub = ChatHub(send_queue_size=2)
+        socket = StuckSocket()
+        conn = Connection(socket, "bob", "c1", 2)
+        conn.writer = asyncio.create_task(conn.write_loop())
+        hub._conversations["c1"] = {conn}
+        hub.connections = 1
+        for _ in range(5):
+            hub._fan_out("c1", "{}")
+        await asyncio.sleep(0.01)
+        return hub, socket
+
+    hub, socket = asyncio.run(scenario())
+    assert socket.close_code == SLOW_CONSUMER_CLOSE
+    assert hub.evicted == 1
+    assert hub.stats()["conversations"] == 0
+
+
+def test_full_moderation_queue_is_counted():
+    async def scenario():
+        moderation = ModerationQueue(maxsize=1, workers=0)
+        await moderation.start()
+        hub = ChatHub(moderation=moderation, moderation_timeout=0.01)
+        conn = Connection(StuckSocket(), "alice", "c1", 4)
+        await hub.send(conn, "first message here")
+        await hub.send(conn, "second message here")
+        return hub, moderation
+
+    hub, moderation = asyncio.run(scenario())
+    assert moderation.stats()["depth"] == 1
+    assert hub.unmoderated == 1
+
+
+def test_broker_reconnects_after_relay_restart(tmp_path):
+    path = str(tmp_path / "relay.sock")
+
+    async def wait_for(predicate):
+        for _ in range(200):
+            if predicate():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("condition not reached")
+
+    async def scenario():
+        relay = asyncio.create_task(run_relay(path))
+        received = []
+        sender, listener = UnixSocketBroker(path, max_backoff=0.05), UnixSocketBroker(path, max_backoff=0.05)
+        await asyncio.sleep(0.05)
+        await sender.start(lambda conv, payload: None)
+        await listener.start(lambda conv, payload: received.append(payload))
+        await wait_for(lambda: sender.connected and listener.connected)
+
+        relay.cancel()
+        await asyncio.gather(relay, return_exceptions=True)
+        await wait_for(lambda: not sender.connected)
+        await sender.publish("c1", "lost")
+
+        relay = asyncio.create_task(run_relay(path))
+        await wait_for(lambda: sender.connected and listener.connected)
+        await sender.publish("c1", "delivered")
+        await wait_for(lambda: received)
+
+        await sender.stop()
+        await listener.stop()
+        relay.cancel()
+        await asyncio.gather(relay, return_exceptions=True)
+        return received, sender
+
+    received, sender = asyncio.run(scenario())
+    assert received == ["delivered"]
+    assert sender.dropped == 1
+    assert sender.reconnects >= 1
@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+
+from concurrency import AIMDLimiter, ConcurrencyLimitMiddleware
+
+
+def feed(limiter: AIMDLimiter, latencies, inflight: int) -> None:
+    for latency in latencies:
+        limiter.inflight = inflight + 1
+        limiter.release(latency)
+
+
+def test_single_outliers_do_not_cut_the_limit():
+    limiter = AIMDLimiter(initial=64, target_latency=0.25)
+    feed(limiter, [0.3 if i % 200 == 0 else 0.02 for i in range(4000)], inflight=8)
+    assert limiter.limit == 64
+
+
+def test_limit_does_not_sink_at_low_traffic():
+    limiter = AIMDLimiter(initial=64, target_latency=0.25)
+    feed(limiter, [0.3 if i % 5 == 0 else 0.01 for i in range(100)], inflight=0)
+    assert limiter.limit == 64
+
+
+def test_sustained_overshoot_backs_off_to_floor():
+    limiter = AIMDLimiter(initial=64, min_limit=4, target_latency=0.25, cooldown=0)
+    feed(limiter, [0.5] * 100, inflight=60)
+    assert limiter.limit == 4
+
+
+def test_limit_grows_only_when_in_use():
+    limiter = AIMDLimiter(initial=10, target_latency=0.25)
+    feed(limiter, [0.01] * 100, inflight=1)
+    assert limiter.limit == 10
+    feed(limiter, [0.01] * 100, inflight=9)
+    assert limiter.limit > 10
+
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def run_burst(paths):
+    limiter = AIMDLimiter(initial=10)
+    app = ConcurrencyLimitMiddleware(
+        slow_app, limiter, cheap_prefixes=["/api/categories"], exempt_prefixes=["/api/admin"], reserved=0.2
+    )
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[client.get(path) for path in paths])
+
+    return asyncio.run(burst()), limiter
+
+
+def test_overload_is_shed_with_retry_after():
+    responses, limiter = run_burst(["/api/jobs"] * 20)
+    statuses = [r.status_code for r in responses]
+    assert statuses.count(200) == 8
+    assert statuses.count(503) == 12
+    assert all(r.headers["retry-after"] == "1" for r in responses if r.status_code == 503)
+    assert limiter.shed == 12
+
+
+def test_cheap_routes_use_reserved_headroom():
+    responses, _ = run_burst(["/api/jobs"] * 20 + ["/api/categories"] * 5)
+    cheap = [r.status_code for r in responses[20:]]
+    assert cheap.count(200) == 2
+
+
+def test_exempt_routes_bypass_the_limiter():
+    responses, limiter = run_burst(["/api/jobs"] * 20 + ["/api/admin/profile"] * 5)
+    assert all(r.status_code == 200 for r in responses[20:])
+    assert limiter.admitted == 8
@@ -0,0 +1,88 @@
+import json
+import logging
+import queue
+
+import pytest
+
+import log_setup
+from log_setup import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    configure_logging,
+    logging_stats,
+    request_id_var,
+    shutdown_logging,
+)
+
+
+def make_record(level: int = logging.INFO, msg: str = "hello %s", args=("world",), **extra) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.fixture
+def fresh_logging():
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    log_setup._listener = log_setup._handler = log_setup._sink = None
+    yield
+    shutdown_logging()
+    log_setup._listener = log_setup._handler = log_setup._sink = None
+    root.handlers[:], level = saved
+    root.setLevel(level)
+
+
+def test_queue_handler_drops_and_counts_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 2
+
+
+def test_queue_handler_tags_request_context():
+    handler = DroppingQueueHandler(queue.Queue())
+    token = request_id_var.set("req-1")
+    try:
+        handler.handle(make_record())
+    finally:
+        request_id_var.reset(token)
+    record = handler.queue.get_nowait()
+    assert record.request_id == "req-1"
+    assert record.msg == "hello world" and record.args is None
+
+
+def test_sampling_filter():
+    sampler = SamplingFilter(debug_rate=0.0, info_rate=0.0)
+    assert not sampler.filter(make_record(logging.DEBUG))
+    assert not sampler.filter(make_record(logging.INFO))
+    assert sampler.filter(make_record(logging.INFO, sample=False))
+    assert sampler.filter(make_record(logging.WARNING))
+    assert sampler.sampled_out == 2
+    assert SamplingFilter(info_rate=1.0).filter(make_record(logging.INFO))
+
+
+def test_json_formatter_writes_known_fields_only():
+    line = JsonFormatter().format(make_record(request_id="r1", status=200, password="secret"))
+    entry = json.loads(line)
+    assert entry["msg"] == "hello world"
+    assert entry["request_id"] == "r1" and entry["status"] == 200
+    assert "password" not in entry
+
+
+def test_logging_survives_shutdown_and_reconfigure(fresh_logging, capsys):
+    log = logging.getLogger("test.lifecycle")
+    configure_logging()
+    log.warning("first")
+    shutdown_logging()
+    log.warning("after shutdown")
+    configure_logging()
+    log.warning("second")
+    shutdown_logging()
+
+    messages = [json.loads(line)["msg"] for line in capsys.readouterr().out.splitlines()]
+    assert messages == ["first", "after shutdown", "second"]
+    assert logging_stats()["dropped"] == 0
@@ -0,0 +1,129 @@
+import asyncio
+
+from moderation_queue import ModerationJob, ModerationQueue
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def job(n: int, text: str = "hello there, how are you?") -> ModerationJob:
+    return ModerationJob(f"m{n}", "c1", "alice", text)
+
+
+class RecordingSink:
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.batches: list[list[dict]] = []
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self, records):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("sink down")
+        self.batches.append(records)
+
+    @property
+    def written(self) -> int:
+        return sum(len(b) for b in self.batches)
+
+
+def test_batches_are_written_by_size():
+    async def scenario():
+        sink = RecordingSink()
+        queue = ModerationQueue(sink, workers=2, batch_size=3, flush_interval=60)
+        await queue.start()
+        for n in range(6):
+            await queue.submit(job(n))
+        await queue._queue.join()
+        sizes = [len(b) for b in sink.batches]
+        await queue.stop()
+        return sizes, queue.processed
+
+    assert run(scenario()) == ([3, 3], 6)
+
+
+def test_batches_are_written_by_interval():
+    async def scenario():
+        sink = RecordingSink()
+        queue = ModerationQueue(sink, workers=1, batch_size=100, flush_interval=0.05)
+        await queue.start()
+        await queue.submit(job(1))
+        await queue.submit(job(2))
+        await asyncio.sleep(0.2)
+        sizes = [len(b) for b in sink.batches]
+        await queue.stop()
+        return sizes
+
+    assert run(scenario()) == [2]
+
+
+def test_records_carry_check_results():
+    async def scenario():
+        sink = RecordingSink()
+        queue = ModerationQueue(sink, workers=1)
+        await queue.start()
+        await queue.submit(job(1, "mail me at joe@example.com"))
+        await queue.stop()
+        return sink.batches[0][0]
+
+    record = run(scenario())
+    assert record["message_id"] == "m1"
+    assert record["blocked"] is True
+    assert record["matched_patterns"]
+
+
+def test_stop_drains_queue_and_finishes_inflight_write():
+    async def scenario():
+        sink = RecordingSink(delay=0.2)
+        queue = ModerationQueue(sink, workers=2, batch_size=100, flush_interval=0.01)
+        await queue.start()
+        for n in range(5):
+            await queue.submit(job(n))
+        # Stop while the flusher is inside the sink write
+        await asyncio.sleep(0.1)
+        await queue.stop()
+        return sink.written, queue.failed_writes, queue.dropped
+
+    assert run(scenario()) == (5, 0, 0)
+
+
+def test_submit_counts_drops_when_full():
+    async def scenario():
+        queue = ModerationQueue(RecordingSink(), maxsize=1, workers=0)
+        await queue.start()
+        accepted = [queue.submit_nowait(job(1)), queue.submit_nowait(job(2))]
+        accepted.append(await queue.submit(job(3), timeout=0.01))
+        await queue.stop(timeout=0.01)
+        return accepted, queue.dropped
+
+    # job 1 is abandoned by stop() after the drain times out
+    assert run(scenario()) == ([True, False, False], 3)
+
+
+def test_submit_after_stop_is_refused():
+    async def scenario():
+        queue = ModerationQueue(RecordingSink(), workers=1)
+        await queue.start()
+        await queue.stop()
+        return queue.submit_nowait(job(1)), await queue.submit(job(2))
+
+    assert run(scenario()) == (False, False)
+
+
+def test_failed_and_cancelled_writes_are_counted():
+    async def scenario():
+        failing = ModerationQueue(RecordingSink(fail=True), workers=1, batch_size=2)
+        await failing.start()
+        for n in range(2):
+            await failing.submit(job(n))
+        await failing.stop()
+
+        hanging = ModerationQueue(RecordingSink(delay=60), workers=1, batch_size=1)
+        await hanging.start()
+        await hanging.submit(job(1))
+        await asyncio.sleep(0.1)
+        await hanging.stop(timeout=0.05)
+        return failing.failed_writes, hanging.failed_writes, hanging.dropped
+
+    assert run(scenario()) == (2, 1, 0)
@@ -0,0 +1,45 @@
+import json
+import logging
+import threading
+import time
+
+import profiling
+from log_setup import JsonFormatter
+from profiling import SamplingProfiler, span
+
+
+def busy_wait(stop: threading.Event) -> None:
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def test_sample_includes_worker_threads(tmp_path):
+    profiler = SamplingProfiler(tmp_path)
+    profiler.attach()
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_wait, args=(stop,), name="asyncio_0")
+    worker.start()
+    try:
+        stacks = profiler.sample()
+    finally:
+        stop.set()
+        worker.join()
+    assert any(s.startswith("asyncio_0;") and "busy_wait" in s for s in stacks)
+    # The calling thread is the sampler here, so it leaves itself out
+    assert not any(s.startswith("event-loop;") for s in stacks)
+
+
+def test_span_attributes_are_logged_under_attrs(monkeypatch, caplog):
+    monkeypatch.setattr(profiling, "TRACING_ENABLED", True)
+    with caplog.at_level(logging.INFO, logger="profiling"):
+        with span("moderation.check", message_id="m1", name="shadows LogRecord.name"):
+            pass
+    entry = json.loads(JsonFormatter().format(caplog.records[-1]))
+    assert entry["span"] == "moderation.check"
+    assert entry["attrs"] == {"message_id": "m1", "name": "shadows LogRecord.name"}
+    assert entry["logger"] == "profiling"
+
+
+def test_span_is_a_shared_noop_when_disabled(monkeypatch):
+    monkeypatch.setattr(profiling, "TRACING_ENABLED", False)
+    assert span("a", x=1) is span("b")
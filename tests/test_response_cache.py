@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+from fastapi import FastAPI, Query
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from response_cache import ResponseCache, make_key
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_request(path: str, query: str = "") -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": []})
+
+
+class CountingLoader:
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        n = self.calls
+        await asyncio.sleep(self.delay)
+        return {"n": n}
+
+
+def body(response) -> dict:
+    return json.loads(response.body)
+
+
+def test_fresh_entry_is_served_from_cache():
+    async def scenario():
+        cache, load = ResponseCache(), CountingLoader()
+        first = await cache.get_or_load("k", load, ttl=60)
+        second = await cache.get_or_load("k", load, ttl=60)
+        return load.calls, body(first), body(second), cache.hits
+
+    assert run(scenario()) == (1, {"n": 1}, {"n": 1}, 1)
+
+
+def test_expired_entry_is_reloaded():
+    async def scenario():
+        cache, load = ResponseCache(), CountingLoader()
+        await cache.get_or_load("k", load, ttl=0.01)
+        await asyncio.sleep(0.02)
+        return body(await cache.get_or_load("k", load, ttl=0.01)), load.calls
+
+    assert run(scenario()) == ({"n": 2}, 2)
+
+
+def test_stale_entry_is_served_while_revalidating():
+    async def scenario():
+        cache, load = ResponseCache(), CountingLoader()
+        await cache.get_or_load("k", load, ttl=0.01, stale_ttl=60)
+        await asyncio.sleep(0.02)
+        stale = await cache.get_or_load("k", load, ttl=60, stale_ttl=60)
+        while cache._inflight:
+            await asyncio.sleep(0)
+        refreshed = await cache.get_or_load("k", load, ttl=60)
+        return body(stale), body(refreshed), cache.stale_hits
+
+    assert run(scenario()) == ({"n": 1}, {"n": 2}, 1)
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache, load = ResponseCache(), CountingLoader(delay=0.01)
+        responses = await asyncio.gather(*[cache.get_or_load("k", load, ttl=60) for _ in range(20)])
+        return load.calls, {r.body for r in responses}, cache.coalesced
+
+    calls, bodies, coalesced = run(scenario())
+    assert calls == 1
+    assert len(bodies) == 1
+    assert coalesced == 19
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def scenario():
+        cache, load = ResponseCache(max_entries=2), CountingLoader()
+        for key in ("a", "b"):
+            await cache.get_or_load(key, load, ttl=60)
+        await cache.get_or_load("a", load, ttl=60)
+        await cache.get_or_load("c", load, ttl=60)
+        return sorted(cache._entries), cache.evictions
+
+    assert run(scenario()) == (["a", "c"], 1)
+
+
+def test_invalidate_detaches_inflight_load():
+    async def scenario():
+        cache, load = ResponseCache(), CountingLoader(delay=0.01)
+        before = asyncio.ensure_future(cache.get_or_load("k", load, ttl=60))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        after = await cache.get_or_load("k", load, ttl=60)
+        return body(await before), body(after), body(await cache.get_or_load("k", load, ttl=60))
+
+    assert run(scenario()) == ({"n": 1}, {"n": 2}, {"n": 2})
+
+
+def test_invalidate_tag_drops_entries_and_inflight_loads():
+    async def scenario():
+        cache, load = ResponseCache(), CountingLoader(delay=0.01)
+        await cache.get_or_load("a", load, ttl=60, tags=("jobs",))
+        pending = asyncio.ensure_future(cache.get_or_load("b", load, ttl=60, tags=("jobs",)))
+        await asyncio.sleep(0)
+        dropped = cache.invalidate_tag("jobs")
+        await pending
+        return dropped, sorted(cache._entries), "b" in cache._inflight
+
+    assert run(scenario()) == (1, [], False)
+
+
+def test_make_key_sorts_and_escapes_query():
+    assert make_key(make_request("/api/jobs", "b=2&a=1"), "public") == make_key(
+        make_request("/api/jobs", "a=1&b=2"), "public"
+    )
+    assert make_key(make_request("/api/jobs", "a=1%26b%3D2"), "public") != make_key(
+        make_request("/api/jobs", "a=1&b=2"), "public"
+    )
+
+
+def test_invalidating_other_keys_does_not_discard_loads():
+    async def scenario():
+        cache, load = ResponseCache(), CountingLoader(delay=0.01)
+        pending = asyncio.ensure_future(cache.get_or_load("/api/categories/legal", load, ttl=60))
+        await asyncio.sleep(0)
+        cache.invalidate_tag("jobs")
+        cache.invalidate("/api/jobs")
+        cache.invalidate_prefix("/api/jobs")
+        await pending
+        return sorted(cache._entries)
+
+    assert run(scenario()) == ["/api/categories/legal"]
+
+
+def test_make_key_ignores_undeclared_params():
+    declared = frozenset({"page"})
+    assert make_key(make_request("/api/jobs", "page=2&x=123"), "public", declared) == make_key(
+        make_request("/api/jobs", "page=2"), "public", declared
+    )
+
+
+def test_cached_route_keys_on_declared_params():
+    cache, calls = ResponseCache(), []
+    app = FastAPI()
+
+    @app.get("/items/{kind}")
+    @cache.cached(ttl=60)
+    async def items(kind: str, page: int = 1, size: int = Query(10, alias="per_page")):
+        calls.append((kind, page, size))
+        return {"kind": kind, "page": page, "size": size}
+
+    client = TestClient(app)
+    assert client.get("/items/a?page=2&x=1").json() == {"kind": "a", "page": 2, "size": 10}
+    client.get("/items/a?page=2&x=2")
+    client.get("/items/a?page=2&per_page=5")
+    assert calls == [("a", 2, 10), ("a", 2, 5)]
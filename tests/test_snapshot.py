@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import message_filter
+from catalog import CATEGORIES, PRICING_PLANS
+from message_filter import BLOCKED_PATTERNS, SUSPICIOUS_PHRASES
+from snapshot import HEADER, Snapshot, SnapshotBuilder, build_catalog_snapshot, open_catalog_snapshot, source_digest
+
+
+def test_catalog_snapshot_round_trip(tmp_path):
+    snap = build_catalog_snapshot(tmp_path / "catalog.snap")
+    assert json.loads(bytes(snap.raw("response:/api/categories"))) == CATEGORIES
+    assert json.loads(bytes(snap.raw("response:/api/pricing/plans"))) == PRICING_PLANS
+    assert snap.strings("categories") == list(CATEGORIES)
+    assert snap.strings("category:legal")[0] == CATEGORIES["legal"]["name"]
+    assert snap.strings("moderation:blocked_patterns") == BLOCKED_PATTERNS
+    assert snap.strings("moderation:suspicious_phrases") == SUSPICIOUS_PHRASES
+    assert snap.digest == source_digest()
+
+
+def test_moderation_rules_load_from_snapshot(tmp_path):
+    snap = build_catalog_snapshot(tmp_path / "catalog.snap")
+    try:
+        message_filter.load_rules([r"\bsecret\b"], ["ping me"])
+        assert message_filter.filter_message("the SECRET word") == (f"the {message_filter.REPLACEMENT_TEXT} word", True)
+        assert message_filter.is_suspicious_message("please ping me later") == (True, "Suspicious phrase: ping me")
+    finally:
+        message_filter.load_rules(snap.strings("moderation:blocked_patterns"), snap.strings("moderation:suspicious_phrases"))
+    assert message_filter.contains_blocked_content("mail joe@example.com")[0]
+
+
+def test_strings_are_interned(tmp_path):
+    builder = SnapshotBuilder()
+    builder.add_strings("a", ["Web Design", "Logo Design"])
+    builder.add_strings("b", ["Web Design", "ünïcode"])
+    path = tmp_path / "s.snap"
+    path.write_bytes(builder.build(b"\0" * 32))
+    snap = Snapshot(path)
+    assert snap.stats()["strings"] == 3
+    assert snap.strings("b") == ["Web Design", "ünïcode"]
+
+
+def test_existing_snapshot_is_mapped_without_rebuilding(tmp_path):
+    path = tmp_path / "catalog.snap"
+    built = build_catalog_snapshot(path)
+    mtime = path.stat().st_mtime_ns
+    assert open_catalog_snapshot(path).digest == built.digest
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_stale_snapshot_is_rebuilt(tmp_path):
+    path = tmp_path / "catalog.snap"
+    build_catalog_snapshot(path)
+    data = bytearray(path.read_bytes())
+    HEADER.pack_into(data, 0, *HEADER.unpack_from(data)[:3], b"\0" * 32)
+    path.write_bytes(bytes(data))
+    assert open_catalog_snapshot(path).digest == source_digest()
+
+
+def test_rejects_foreign_files(tmp_path):
+    path = tmp_path / "bad.snap"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        Snapshot(path)